@@ -1,11 +1,84 @@
+import base64
 import logging
-import secrets
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Sequence
 
 import bcrypt
+from pymongo.errors import DuplicateKeyError
 
+from config import Config
 from models import DatabaseManager
 
+# bcrypt is CPU-bound, so hashing runs in a process pool (BCRYPT_POOL_SIZE, the core
+# count by default) instead of pinning the request thread. Created lazily on first use.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Return the shared bcrypt process pool, creating it if needed."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # The pool is created from a request thread while other threads exist,
+                # so workers come from a forkserver rather than forking this process
+                # where the platform has one (Windows only spawns, which is also safe)
+                start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else None
+                _executor = ProcessPoolExecutor(
+                    max_workers=Config.BCRYPT_POOL_SIZE,
+                    mp_context=multiprocessing.get_context(start_method)
+                )
+    return _executor
+
+
+def _discard_executor(broken: ProcessPoolExecutor) -> None:
+    """Drop a pool whose worker died, so the next call builds a fresh one."""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def _run_in_pool(fn: Callable, calls: Sequence[tuple]) -> list:
+    """Run ``fn(*args)`` for each args tuple in the bcrypt pool, in order.
+    
+    A pool with a dead worker (OOM kill, crash) is broken for good, so it is
+    replaced and the calls retried once.
+    """
+    executor = _get_executor()
+    try:
+        futures = [executor.submit(fn, *args) for args in calls]
+        return [future.result() for future in futures]
+    except BrokenProcessPool:
+        _discard_executor(executor)
+        executor = _get_executor()
+        futures = [executor.submit(fn, *args) for args in calls]
+        return [future.result() for future in futures]
+
+
+def _encode_password(password: str) -> bytes:
+    """Encode a password for bcrypt, which only reads the first 72 bytes."""
+    if password.isascii():
+        return password.encode('ascii')[:72]
+    return password.encode('utf-8')[:72]
+
+
+def _bcrypt_hash(password: bytes, rounds: int) -> bytes:
+    """Hash a password in a pool worker."""
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _bcrypt_check(password: bytes, hashed: bytes) -> bool:
+    """Verify a password in a pool worker."""
+    return bcrypt.checkpw(password, hashed)
+
 
 class Authentication:
     """Handles user authentication operations."""
@@ -18,6 +91,11 @@ class Authentication:
         """
         self.db_manager = db_manager
         self.logger = logging.getLogger(__name__)
+        self.bcrypt_cost = Config.BCRYPT_COST
+        self._cost_prefix = f"{self.bcrypt_cost:02d}"
+        
+        # Verified against when the user doesn't exist so both paths cost the same
+        self._dummy_hash = bcrypt.hashpw(b"x", bcrypt.gensalt(rounds=self.bcrypt_cost)).decode('utf-8')
     
     def hash_password(self, password: str) -> str:
         """Hash a password using bcrypt.
@@ -28,7 +106,31 @@ class Authentication:
         Returns:
             str: Hashed password
         """
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        hashed, = _run_in_pool(_bcrypt_hash, [(_encode_password(password), self.bcrypt_cost)])
+        return hashed.decode('utf-8')
+    
+    def hash_passwords_batch(self, passwords: Iterable[str]) -> List[str]:
+        """Hash many passwords in parallel across the bcrypt process pool.
+        
+        Args:
+            passwords: Plain text passwords (e.g. for a bulk user import)
+            
+        Returns:
+            List[str]: Hashed passwords, in the same order as the input
+        """
+        calls = [(_encode_password(password), self.bcrypt_cost) for password in passwords]
+        return [hashed.decode('utf-8') for hashed in _run_in_pool(_bcrypt_hash, calls)]
+    
+    def password_needs_rehash(self, hashed: str) -> bool:
+        """Check whether a hash was made with a different cost than configured.
+        
+        Args:
+            hashed: Hashed password in modular crypt format ($2b$NN$...)
+            
+        Returns:
+            bool: True if the hash should be regenerated, False otherwise
+        """
+        return hashed[4:6] != self._cost_prefix
     
     def verify_password(self, password: str, hashed: str) -> bool:
         """Verify a password against its hash.
@@ -40,7 +142,24 @@ class Authentication:
         Returns:
             bool: True if password matches, False otherwise
         """
-        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+        # bcrypt hashes are ASCII-only by spec
+        matches, = _run_in_pool(_bcrypt_check, [(_encode_password(password), hashed.encode('ascii'))])
+        return matches
+    
+    def _get_user_by_email(self, email: str):
+        """Look up only the fields needed for authentication.
+        
+        Not cached: a per-process cache would keep accepting an old password hash in
+        other workers after a reset, and cache hits would answer existing emails
+        faster than unknown ones.
+        
+        Args:
+            email: User's email address
+            
+        Returns:
+            dict: User's _id, password hash and is_active flag, or None if not found
+        """
+        return self.db_manager.usuarios.find_one({"email": email}, {"_id": 1, "password": 1, "is_active": 1})
     
     def register_user(self, email: str, password: str) -> dict:
         """Register a new user.
@@ -54,7 +173,7 @@ class Authentication:
         """
         try:
             # Check if user already exists
-            existing_user = self.db_manager.usuarios.find_one({"email": email})
+            existing_user = self.db_manager.usuarios.find_one({"email": email}, {"_id": 1})
             if existing_user:
                 return {"success": False, "message": "User already exists"}
             
@@ -75,6 +194,9 @@ class Authentication:
             else:
                 return {"success": False, "message": "Failed to register user"}
                 
+        except DuplicateKeyError:
+            # Lost a race with a concurrent registration for the same email
+            return {"success": False, "message": "User already exists"}
         except Exception as e:
             self.logger.error(f"Registration error: {e}")
             return {"success": False, "message": "Registration failed"}
@@ -91,8 +213,10 @@ class Authentication:
         """
         try:
             # Find user by email
-            user = self.db_manager.usuarios.find_one({"email": email})
+            user = self._get_user_by_email(email)
             if not user:
+                # Burn the same bcrypt work so timing doesn't reveal unknown emails
+                self.verify_password(password, self._dummy_hash)
                 return {"success": False, "message": "Invalid credentials"}
             
             # Verify password
@@ -103,13 +227,45 @@ class Authentication:
             if not user.get("is_active", True):
                 return {"success": False, "message": "Account is deactivated"}
             
+            # Upgrade (or downgrade) the stored hash if the cost factor changed
+            if self.password_needs_rehash(user["password"]):
+                self._rehash_password(user["_id"], user["password"], password)
+            
             self.logger.info(f"User authenticated successfully: {email}")
-            return {"success": True, "user": {"id": str(user["_id"]), "email": user["email"]}}
+            return {"success": True, "user": {"id": str(user["_id"]), "email": email}}
             
         except Exception as e:
             self.logger.error(f"Authentication error: {e}")
             return {"success": False, "message": "Authentication failed"}
     
+    def _rehash_password(self, user_id, old_hash: str, password: str) -> None:
+        """Schedule a fresh hash of a verified password using the configured cost.
+        
+        The hash runs in the bcrypt pool and is stored from its done-callback, so
+        the login response doesn't wait for a second bcrypt round.
+        
+        Args:
+            user_id: User's ObjectId
+            old_hash: Stored hash the password was verified against
+            password: Plain text password that was just verified
+        """
+        def store(future):
+            try:
+                # Matching on the old hash keeps a password changed meanwhile from being overwritten
+                self.db_manager.usuarios.update_one(
+                    {"_id": user_id, "password": old_hash},
+                    {"$set": {"password": future.result().decode('utf-8'), "updated_at": datetime.utcnow()}}
+                )
+            except Exception as e:
+                self.logger.warning(f"Password rehash failed for user {user_id}: {e}")
+        
+        try:
+            future = _get_executor().submit(_bcrypt_hash, _encode_password(password), self.bcrypt_cost)
+            future.add_done_callback(store)
+        except Exception as e:
+            # A failed rehash must never block a successful login
+            self.logger.warning(f"Password rehash failed for user {user_id}: {e}")
+    
     def request_password_reset(self, email: str) -> dict:
         """Request a password reset token.
         
@@ -121,14 +277,16 @@ class Authentication:
         """
         try:
             # Check if user exists
-            user = self.db_manager.usuarios.find_one({"email": email})
+            user = self._get_user_by_email(email)
             if not user:
                 # Don't reveal if user exists or not for security
                 return {"success": True, "message": "If an account with that email exists, a reset link has been sent"}
             
             # Generate secure reset token
-            reset_token = secrets.token_urlsafe(32)
-            expires_at = datetime.utcnow() + timedelta(hours=1)  # Token expires in 1 hour
+            # Same as secrets.token_urlsafe(32) without the extra call layers
+            reset_token = base64.urlsafe_b64encode(os.urandom(32)).rstrip(b"=").decode("ascii")
+            now = datetime.utcnow()
+            expires_at = now + timedelta(hours=1)  # Token expires in 1 hour
             
             # Store reset token in database
             token_data = {
@@ -137,7 +295,7 @@ class Authentication:
                 "token": reset_token,
                 "expires_at": expires_at,
                 "used": False,
-                "created_at": datetime.utcnow()
+                "created_at": now
             }
             
             # Remove any existing tokens for this user
@@ -171,11 +329,13 @@ class Authentication:
             dict: Password reset result
         """
         try:
+            now = datetime.utcnow()
+            
             # Find valid token
             reset_data = self.db_manager.reset_tokens.find_one({
                 "token": token,
                 "used": False,
-                "expires_at": {"$gt": datetime.utcnow()}
+                "expires_at": {"$gt": now}
             })
             
             if not reset_data:
@@ -187,14 +347,14 @@ class Authentication:
             # Update user password
             update_result = self.db_manager.usuarios.update_one(
                 {"_id": reset_data["user_id"]},
-                {"$set": {"password": hashed_password, "updated_at": datetime.utcnow()}}
+                {"$set": {"password": hashed_password, "updated_at": now}}
             )
             
             if update_result.modified_count > 0:
                 # Mark token as used
                 self.db_manager.reset_tokens.update_one(
                     {"_id": reset_data["_id"]},
-                    {"$set": {"used": True, "used_at": datetime.utcnow()}}
+                    {"$set": {"used": True, "used_at": now}}
                 )
                 
                 # Revoke all refresh tokens on password change for security
@@ -212,24 +372,4 @@ class Authentication:
                 
         except Exception as e:
             self.logger.error(f"Password reset error: {e}")
-            return {"success": False, "message": "Password reset failed"}
-    
-    def cleanup_expired_tokens(self) -> int:
-        """Clean up expired reset tokens.
-        
-        Returns:
-            int: Number of tokens cleaned up
-        """
-        try:
-            result = self.db_manager.reset_tokens.delete_many({
-                "expires_at": {"$lt": datetime.utcnow()}
-            })
-            
-            if result.deleted_count > 0:
-                self.logger.info(f"Cleaned up {result.deleted_count} expired reset tokens")
-            
-            return result.deleted_count
-            
-        except Exception as e:
-            self.logger.error(f"Token cleanup error: {e}")
-            return 0
\ No newline at end of file
+            return {"success": False, "message": "Password reset failed"}
\ No newline at end of file
@@ -1,12 +1,33 @@
 from functools import wraps
 
-from flask_jwt_extended import jwt_required
+from flask import g
+from flask_jwt_extended import get_jwt, get_jwt_header, verify_jwt_in_request
+
+from utils.jwt_cache import get_token_from_header, get_cached_jwt, cache_verified_jwt, cache_enabled
 
 
 def auth_required(f):
-    """Decorator for routes that require authentication."""
+    """Decorator for routes that require authentication.
+
+    Access tokens that already passed verification are served from a short-lived
+    cache, skipping signature verification on repeat requests. A cache hit also
+    skips flask_jwt_extended's per-request callbacks, so the cache is bypassed
+    whenever the JWTManager has a token_in_blocklist_loader, user_lookup_loader
+    or token_verification_loader registered; ``current_user`` is only available
+    in that case.
+    """
     @wraps(f)
-    @jwt_required()
     def decorated_function(*args, **kwargs):
+        token = get_token_from_header() if cache_enabled() else None
+        cached = get_cached_jwt(token) if token else None
+
+        if cached:
+            # Populate the same request state flask_jwt_extended sets after verification
+            g._jwt_extended_jwt_header, g._jwt_extended_jwt = cached
+            g._jwt_extended_jwt_user = {"loaded_user": None}
+            g._jwt_extended_jwt_location = "headers"
+        elif verify_jwt_in_request() and token and g._jwt_extended_jwt_location == "headers":
+            cache_verified_jwt(token, get_jwt_header(), get_jwt())
+
         return f(*args, **kwargs)
     return decorated_function
\ No newline at end of file
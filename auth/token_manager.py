@@ -1,68 +1,167 @@
+import base64
+import hashlib
 import logging
-import secrets
+import os
+import re
+import threading
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+from functools import lru_cache
+from typing import Optional, Dict, List, Set, Tuple
+from bson import Binary
+from cachetools import TTLCache
+from pymongo import ReturnDocument
+from pymongo.write_concern import WriteConcern
 from user_agents import parse
 
 from models import DatabaseManager
 
+# Refresh tokens are 48 random bytes in unpadded urlsafe base64
+_REFRESH_TOKEN_RE = re.compile(r'[A-Za-z0-9_-]{64}')
+
+# How long revoked tokens are kept for auditing before MongoDB's TTL monitor removes them
+REVOKED_TOKEN_RETENTION = timedelta(days=7)
+
+# Serves active/expired range scans, including the active count in token stats
+ACTIVE_EXPIRY_INDEX = [("is_active", 1), ("expires_at", 1)]
+
+# Partial index over revoked tokens only, so the revoked sweep scans just the stale range
+REVOKED_AT_INDEX = [("revoked_at", 1)]
+
+
+def _describe_family(family: str, version: str) -> str:
+    """Format a parsed family and version, skipping the version for unrecognized agents."""
+    if family == "Other" or not version:
+        return family
+    return f"{family} {version}"
+
+
+@lru_cache(maxsize=4096)
+def _describe_user_agent(user_agent: str) -> Tuple[str, str, str, Binary]:
+    """Parse a user agent into (browser, os, device, digest), memoized per UA string.
+    
+    The raw user agent isn't stored; a truncated SHA-256 digest is kept for auditing.
+    """
+    parsed_ua = parse(user_agent)
+    return (
+        _describe_family(parsed_ua.browser.family, parsed_ua.browser.version_string),
+        _describe_family(parsed_ua.os.family, parsed_ua.os.version_string),
+        parsed_ua.device.family,
+        Binary(hashlib.sha256(user_agent.encode('utf-8')).digest()[:16]),
+    )
+
 
 class RefreshTokenManager:
     """Manages stateful refresh tokens with database storage."""
     
+    # Databases whose indexes were already ensured by this process
+    _indexes_built: Set[str] = set()
+    
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
         self.logger = logging.getLogger(__name__)
         
-        # Ensure collection has proper indexes
-        self._ensure_indexes()
+        # Bind the collection once instead of rebuilding it on every call
+        self._tokens = db_manager.database["refresh_tokens"]
+        
+        # Refresh tokens are short-lived and re-issuable, so inserts skip waiting on the journal.
+        # Revocations keep the default write concern since their durability matters for security.
+        self._fast_writes = db_manager.database.get_collection(
+            "refresh_tokens", write_concern=WriteConcern(w=1, j=False)
+        )
+        
+        # Recently rejected tokens, so repeated attempts with the same token skip MongoDB
+        self._invalid_cache = TTLCache(maxsize=100_000, ttl=300)
+        self._invalid_cache_lock = threading.Lock()
+        
+        # Ensure collection has proper indexes (once per database per process)
+        index_key = db_manager.database.name
+        if index_key not in RefreshTokenManager._indexes_built and self._ensure_indexes():
+            # Only recorded on success, so a failed build is retried by the next manager created
+            RefreshTokenManager._indexes_built.add(index_key)
     
-    def _ensure_indexes(self):
-        """Create database indexes for optimal performance."""
+    def _ensure_indexes(self) -> bool:
+        """Create database indexes for optimal performance.
+        
+        Returns:
+            bool: True if every index was created
+        """
+        collection = self._tokens
+        
+        # Drop indexes superseded by the set below (each extra index costs a B-tree write per insert)
         try:
-            # Index on token for fast lookups
-            self.db_manager.database["refresh_tokens"].create_index("token", unique=True)
-            
-            # Index on user_id for user session management
-            self.db_manager.database["refresh_tokens"].create_index("user_id")
-            
-            # Index on expires_at for cleanup operations
-            self.db_manager.database["refresh_tokens"].create_index("expires_at")
+            existing = collection.index_information()
+        except Exception:
+            existing = {}
+        
+        legacy_indexes = ["token_1_is_active_1_expires_at_1", "user_id_1"]
+        if "expires_at_1" in existing and "expireAfterSeconds" not in existing["expires_at_1"]:
+            legacy_indexes.append("expires_at_1")
+        
+        for legacy_index in legacy_indexes:
+            try:
+                collection.drop_index(legacy_index)
+            except Exception:
+                pass
+        
+        try:
+            # Index on token for fast lookups (also serves token + is_active + expires_at filters)
+            collection.create_index("token", unique=True)
             
-            # Compound index for active token lookups
-            self.db_manager.database["refresh_tokens"].create_index([
-                ("token", 1),
+            # Serves the session listing (filter + sort) and per-user revocation via its prefix
+            collection.create_index([
+                ("user_id", 1),
                 ("is_active", 1),
-                ("expires_at", 1)
+                ("last_used", -1)
             ])
             
+            # Compound index for active/expired range scans during cleanup and stats
+            collection.create_index(ACTIVE_EXPIRY_INDEX)
+            
+            # Revoked tokens by revocation time, for the retention sweep during cleanup
+            collection.create_index(REVOKED_AT_INDEX, partialFilterExpression={"is_active": False})
+            
+            built = True
         except Exception as e:
             self.logger.warning(f"Failed to create indexes: {e}")
+            built = False
+        
+        # TTL indexes: MongoDB deletes expired tokens, and revoked ones once their retention ends.
+        # They are the only thing purging tokens, so each is built on its own and a miss is an error
+        for field in ("expires_at", "delete_at"):
+            try:
+                collection.create_index(field, expireAfterSeconds=0)
+            except Exception as e:
+                self.logger.error(f"Failed to create TTL index on {field}: {e}")
+                built = False
+        
+        return built
     
     def create_refresh_token(self, user_id: str, request_info: Dict) -> str:
         """Create and store a refresh token with session information."""
-        token = secrets.token_urlsafe(48)  # 64 characters, URL-safe
-        expires_at = datetime.utcnow() + timedelta(days=30)
+        # 48 random bytes -> 64 URL-safe characters, as secrets.token_urlsafe(48) but inlined
+        token = base64.urlsafe_b64encode(os.urandom(48)).decode("ascii")
+        now = datetime.utcnow()
+        expires_at = now + timedelta(days=30)
         
         # Parse user agent for session tracking
-        user_agent = request_info.get('user_agent', '')
-        parsed_ua = parse(user_agent)
+        user_agent = request_info.get('user_agent') or ''
+        browser, os_name, device, user_agent_hash = _describe_user_agent(user_agent)
         
         token_data = {
             "token": token,
             "user_id": user_id,
             "expires_at": expires_at,
-            "created_at": datetime.utcnow(),
-            "last_used": datetime.utcnow(),
+            "created_at": now,
+            "last_used": now,
             "is_active": True,
             
             # Session tracking information
             "session_info": {
                 "ip_address": request_info.get('ip_address'),
-                "user_agent": user_agent,
-                "browser": f"{parsed_ua.browser.family} {parsed_ua.browser.version_string}",
-                "os": f"{parsed_ua.os.family} {parsed_ua.os.version_string}",
-                "device": parsed_ua.device.family,
+                "user_agent_hash": user_agent_hash,
+                "browser": browser,
+                "os": os_name,
+                "device": device,
                 "location": request_info.get('location', 'Unknown'),
             },
             
@@ -73,7 +172,7 @@ class RefreshTokenManager:
         
         try:
             # Store in refresh_tokens collection
-            result = self.db_manager.database["refresh_tokens"].insert_one(token_data)
+            result = self._fast_writes.insert_one(token_data)
             self.logger.info(f"Refresh token created for user {user_id}")
             return token
             
@@ -83,16 +182,43 @@ class RefreshTokenManager:
     
     def validate_and_rotate_token(self, token: str, request_info: Dict) -> Dict:
         """Validate token and create a new one (token rotation)."""
+        # Malformed tokens can never match; reject them before they reach the cache or MongoDB
+        if not isinstance(token, str) or not _REFRESH_TOKEN_RE.fullmatch(token):
+            return {"valid": False, "error": "Invalid or expired token"}
+        
+        # Keyed on a short digest so cache memory doesn't depend on what clients send
+        cache_key = hashlib.blake2b(token.encode('ascii'), digest_size=16).digest()
+        with self._invalid_cache_lock:
+            known_invalid = cache_key in self._invalid_cache
+        if known_invalid:
+            return {"valid": False, "error": "Invalid or expired token"}
+        
         try:
-            # Find and validate current token
-            token_data = self.db_manager.database["refresh_tokens"].find_one({
-                "token": token,
-                "is_active": True,
-                "expires_at": {"$gt": datetime.utcnow()}
-            })
+            now = datetime.utcnow()
+            
+            # Atomically validate and invalidate the current token so it can't be redeemed twice
+            token_data = self._tokens.find_one_and_update(
+                {
+                    "token": token,
+                    "is_active": True,
+                    "expires_at": {"$gt": now}
+                },
+                {
+                    "$set": {
+                        "is_active": False,
+                        "rotated_at": now,
+                        "rotation_reason": "normal_rotation"
+                    }
+                },
+                projection={"user_id": 1, "session_info": 1},
+                return_document=ReturnDocument.BEFORE
+            )
             
             if not token_data:
                 self.logger.warning(f"Invalid refresh token attempt from {request_info.get('ip_address')}")
+                self._handle_token_reuse(token)
+                with self._invalid_cache_lock:
+                    self._invalid_cache[cache_key] = True
                 return {"valid": False, "error": "Invalid or expired token"}
             
             user_id = token_data["user_id"]
@@ -102,18 +228,6 @@ class RefreshTokenManager:
                 self.logger.warning(f"IP change detected for token. Old: {token_data['session_info']['ip_address']}, New: {request_info.get('ip_address')}")
                 # You could choose to invalidate token here for high security
             
-            # Invalidate old token
-            self.db_manager.database["refresh_tokens"].update_one(
-                {"_id": token_data["_id"]},
-                {
-                    "$set": {
-                        "is_active": False,
-                        "rotated_at": datetime.utcnow(),
-                        "rotation_reason": "normal_rotation"
-                    }
-                }
-            )
-            
             # Create new token
             new_token = self.create_refresh_token(user_id, request_info)
             
@@ -129,15 +243,28 @@ class RefreshTokenManager:
             self.logger.error(f"Token validation error: {e}")
             return {"valid": False, "error": "Token validation failed"}
     
+    def _handle_token_reuse(self, token: str) -> None:
+        """Revoke every session of a user whose already-rotated token was presented again."""
+        reused = self._tokens.find_one(
+            {"token": token, "rotated_at": {"$exists": True}},
+            {"user_id": 1}
+        )
+        
+        if reused:
+            self.logger.warning(f"Rotated refresh token reused for user {reused['user_id']}, revoking all sessions")
+            self.revoke_all_user_tokens(reused["user_id"], "token_reuse_detected")
+    
     def revoke_token(self, token: str, reason: str = "manual_revocation") -> bool:
         """Revoke a specific refresh token."""
         try:
-            result = self.db_manager.database["refresh_tokens"].update_one(
+            now = datetime.utcnow()
+            result = self._tokens.update_one(
                 {"token": token, "is_active": True},
                 {
                     "$set": {
                         "is_active": False,
-                        "revoked_at": datetime.utcnow(),
+                        "revoked_at": now,
+                        "delete_at": now + REVOKED_TOKEN_RETENTION,
                         "revocation_reason": reason
                     }
                 }
@@ -154,13 +281,24 @@ class RefreshTokenManager:
     
     def revoke_all_user_tokens(self, user_id: str, reason: str = "security_action") -> int:
         """Revoke all active refresh tokens for a user."""
+        return self.revoke_tokens_bulk(user_id, None, reason)
+    
+    def revoke_tokens_bulk(self, user_id: str, exclude_token: Optional[str] = None,
+                           reason: str = "revoke_all_others") -> int:
+        """Revoke all active refresh tokens for a user, except ``exclude_token`` if given, in one update."""
         try:
-            result = self.db_manager.database["refresh_tokens"].update_many(
-                {"user_id": user_id, "is_active": True},
+            now = datetime.utcnow()
+            query = {"user_id": user_id, "is_active": True}
+            if exclude_token:
+                query["token"] = {"$ne": exclude_token}
+            
+            result = self._tokens.update_many(
+                query,
                 {
                     "$set": {
                         "is_active": False,
-                        "revoked_at": datetime.utcnow(),
+                        "revoked_at": now,
+                        "delete_at": now + REVOKED_TOKEN_RETENTION,
                         "revocation_reason": reason
                     }
                 }
@@ -176,20 +314,26 @@ class RefreshTokenManager:
             self.logger.error(f"Bulk token revocation error: {e}")
             return 0
     
-    def get_user_sessions(self, user_id: str) -> List[Dict]:
-        """Get all active sessions for a user."""
+    def get_user_sessions(self, user_id: str, limit: int = 100) -> List[Dict]:
+        """Get the most recently used active sessions for a user (at most ``limit``)."""
         try:
-            sessions = list(self.db_manager.database["refresh_tokens"].find(
+            # Inclusion-only projection, so the token and user agent digest are never returned
+            cursor = self._tokens.find(
                 {"user_id": user_id, "is_active": True},
                 {
-                    "token": 0,  # Don't return the actual token
-                    "session_info": 1,
+                    "session_info.ip_address": 1,
+                    "session_info.browser": 1,
+                    "session_info.os": 1,
+                    "session_info.device": 1,
+                    "session_info.location": 1,
                     "created_at": 1,
                     "last_used": 1,
                     "usage_count": 1,
                     "_id": 1
                 }
-            ).sort("last_used", -1))
+            ).sort("last_used", -1).limit(limit).batch_size(50)
+            
+            sessions = list(cursor)
             
             return sessions
             
@@ -197,22 +341,43 @@ class RefreshTokenManager:
             self.logger.error(f"Failed to get user sessions: {e}")
             return []
     
-    def cleanup_expired_tokens(self) -> int:
-        """Remove expired and old revoked tokens."""
+    def cleanup_expired_tokens(self, limit: Optional[int] = None) -> int:
+        """Remove expired and old revoked tokens.
+        
+        The TTL indexes normally handle this; the sweep remains for on-demand use
+        and for revoked tokens written before ``delete_at`` was recorded.
+        
+        Args:
+            limit: Maximum number of tokens to remove in this call, or None for all
+            
+        Returns:
+            int: Number of tokens removed
+        """
         try:
-            # Remove expired tokens
-            expired_result = self.db_manager.database["refresh_tokens"].delete_many({
-                "expires_at": {"$lt": datetime.utcnow()}
-            })
+            now = datetime.utcnow()
             
-            # Remove old revoked tokens (older than 7 days)
-            old_revoked_cutoff = datetime.utcnow() - timedelta(days=7)
-            revoked_result = self.db_manager.database["refresh_tokens"].delete_many({
-                "is_active": False,
-                "revoked_at": {"$lt": old_revoked_cutoff}
-            })
+            # Expired tokens, and revoked tokens past their retention window (7 days). The
+            # expires_at index and the partial revoked_at index bound each range; they are left
+            # to the planner rather than hinted, so a missing index slows cleanup instead of failing it
+            sweeps = [
+                {"expires_at": {"$lt": now}},
+                {"is_active": False, "revoked_at": {"$lt": now - REVOKED_TOKEN_RETENTION}}
+            ]
             
-            total_cleaned = expired_result.deleted_count + revoked_result.deleted_count
+            total_cleaned = 0
+            for stale_filter in sweeps:
+                if limit is None:
+                    total_cleaned += self._tokens.delete_many(stale_filter).deleted_count
+                    continue
+                
+                # Delete a bounded batch by _id so one call never holds a huge delete open; the
+                # _id read doubles as a probe, so an idle sweep never issues a delete at all
+                remaining = limit - total_cleaned
+                if remaining <= 0:
+                    break
+                stale_ids = [doc["_id"] for doc in self._tokens.find(stale_filter, {"_id": 1}).limit(remaining)]
+                if stale_ids:
+                    total_cleaned += self._tokens.delete_many({"_id": {"$in": stale_ids}, **stale_filter}).deleted_count
             
             if total_cleaned > 0:
                 self.logger.info(f"Cleaned up {total_cleaned} old tokens")
@@ -226,26 +391,13 @@ class RefreshTokenManager:
     def get_token_stats(self) -> Dict:
         """Get statistics about refresh tokens."""
         try:
-            pipeline = [
-                {
-                    "$group": {
-                        "_id": "$is_active",
-                        "count": {"$sum": 1}
-                    }
-                }
-            ]
-            
-            stats = list(self.db_manager.database["refresh_tokens"].aggregate(pipeline))
-            
-            result = {"active": 0, "inactive": 0, "total": 0}
-            for stat in stats:
-                if stat["_id"]:
-                    result["active"] = stat["count"]
-                else:
-                    result["inactive"] = stat["count"]
+            # Total comes from collection metadata; the (is_active, expires_at) index serves the
+            # active count. Not hinted, so a missing index slows stats instead of zeroing them
+            total = self._tokens.estimated_document_count()
+            active = self._tokens.count_documents({"is_active": True})
             
-            result["total"] = result["active"] + result["inactive"]
-            return result
+            # The metadata count is approximate, so never report a negative remainder
+            return {"active": active, "inactive": max(total - active, 0), "total": max(total, active)}
             
         except Exception as e:
             self.logger.error(f"Failed to get token stats: {e}")
@@ -1,5 +1,5 @@
 from datetime import timedelta
-from os import getenv
+from os import cpu_count, getenv
 
 from dotenv import load_dotenv
 
@@ -11,4 +11,16 @@ class Config:
     
     JWT_SECRET_KEY = getenv('JWT_SECRET_KEY', 'your-secret-key-change-this')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=2)
-    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
\ No newline at end of file
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    
+    # bcrypt work factor; each +1 doubles the CPU cost of a login
+    BCRYPT_COST = int(getenv('BCRYPT_COST', '12'))
+    
+    # bcrypt worker processes per app process; lower it when running several gunicorn workers
+    BCRYPT_POOL_SIZE = int(getenv('BCRYPT_POOL_SIZE', str(cpu_count() or 1)))
+    
+    # Shared rate limit counters so every worker enforces the same budget
+    RATE_LIMIT_STORAGE_URI = getenv('RATE_LIMIT_STORAGE_URI', 'redis://localhost:6379/0')
+    
+    # Auth payloads are tiny; larger bodies are refused before any JSON parsing
+    MAX_CONTENT_LENGTH = 4096
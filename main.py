@@ -1,7 +1,7 @@
 import logging
 import sys
 
-from flask import Flask
+from flask import Flask, abort, request
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flask_limiter import Limiter
@@ -13,7 +13,8 @@ from routes.auth_routes import init_auth_routes
 from routes.user_routes import init_user_routes
 from utils.rate_limits import get_remote_address
 from utils.error_handlers import setup_error_handlers
-from utils.scheduler import TokenCleanupScheduler
+from utils.json_provider import OrjsonProvider
+from utils.log_queue import setup_queue_logging
 
 
 def create_app():
@@ -22,6 +23,15 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
     
+    # Serialize JSON responses with orjson
+    app.json = OrjsonProvider(app)
+    
+    # Refuse oversized bodies up front, before the rate limiter or a route reads them
+    @app.before_request
+    def reject_oversized_body():
+        if request.content_length and request.content_length > app.config['MAX_CONTENT_LENGTH']:
+            abort(413)
+    
     # Initialize CORS with credentials support
     CORS(app, 
          origins=["http://localhost:3000"],
@@ -31,17 +41,33 @@ def create_app():
     # Initialize JWT
     jwt = JWTManager(app)
     
+    # HMAC algorithms sign and verify with the same secret; resolve it once rather than
+    # re-reading app config on every token issued or checked. Asymmetric algorithms keep
+    # the default loaders, which read JWT_PRIVATE_KEY/JWT_PUBLIC_KEY
+    if app.config.get('JWT_ALGORITHM', 'HS256').startswith('HS'):
+        signing_key = app.config['JWT_SECRET_KEY'].encode('utf-8')
+        jwt.encode_key_loader(lambda identity: signing_key)
+        jwt.decode_key_loader(lambda jwt_header, jwt_data: signing_key)
+    
     # Initialize rate limiter
     limiter = Limiter(
         app=app,
         key_func=get_remote_address,
         default_limits=["1000 per hour"],
-        storage_uri="memory://"
+        storage_uri=Config.RATE_LIMIT_STORAGE_URI,
+        # Sliding window avoids the burst-at-boundary of fixed windows; on Redis each hit is one atomic Lua call
+        strategy="moving-window",
+        # Pooled Redis connections with short timeouts so a slow Redis can't stall requests
+        storage_options={"max_connections": 50, "socket_timeout": 0.5, "socket_connect_timeout": 0.5},
+        in_memory_fallback_enabled=True  # Keep limiting per-process if Redis is unreachable
     )
     
     # Setup comprehensive error handlers
     setup_error_handlers(app)
     
+    # Hand log I/O to a background thread so request threads only enqueue records
+    setup_queue_logging()
+    
     # Initialize database manager
     db_manager = DatabaseManager()
     
@@ -60,12 +86,7 @@ def create_app():
     app.register_blueprint(auth_bp)
     app.register_blueprint(user_bp)
     
-    # Start token cleanup scheduler
-    cleanup_scheduler = TokenCleanupScheduler(token_manager, interval_hours=24)
-    cleanup_scheduler.start()
-    
-    # Store scheduler in app context for graceful shutdown
-    app.cleanup_scheduler = cleanup_scheduler
+    # Expired and revoked tokens are purged by MongoDB TTL indexes (see token manager)
     
     return app
 
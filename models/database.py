@@ -1,4 +1,5 @@
 import logging
+from importlib.util import find_spec
 from os import getenv
 from typing import Optional
 
@@ -10,6 +11,19 @@ from pymongo.database import Database
 
 load_dotenv()
 
+# Setup logging once at import rather than on every DatabaseManager construction
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+
+def _wire_compressors() -> str:
+    """List wire compressors in preference order, skipping ones whose optional package is missing."""
+    compressors = [name for name, module in (("zstd", "zstandard"), ("snappy", "snappy")) if find_spec(module)]
+    compressors.append("zlib")  # Always available
+    return ",".join(compressors)
+
 
 class DatabaseManager:
     """Manages MongoDB database connections and operations."""
@@ -27,12 +41,6 @@ class DatabaseManager:
         self.database: Optional[Database] = None
         self.usuarios: Optional[Collection] = None
         self.reset_tokens: Optional[Collection] = None
-        
-        # Setup logging
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
         self.logger = logging.getLogger(__name__)
         
     def connect(self) -> bool:
@@ -48,8 +56,16 @@ class DatabaseManager:
                 self.logger.error("MONGODB_STRING environment variable not set")
                 return False
                 
-            # Establish connection
-            self.client = MongoClient(db_url)
+            # Establish connection with an explicit pool sized for concurrent Flask workers
+            self.client = MongoClient(
+                db_url,
+                maxPoolSize=100,
+                minPoolSize=10,
+                waitQueueTimeoutMS=2000,
+                serverSelectionTimeoutMS=3000,
+                retryWrites=True,
+                compressors=_wire_compressors()
+            )
             
             # Test connection
             self.client.admin.command('ping')
@@ -60,6 +76,8 @@ class DatabaseManager:
             self.usuarios = self.database[self.collection_name]
             self.reset_tokens = self.database["PasswordResetTokens"]
             
+            self._ensure_indexes()
+            
             return True
             
         except pymongo.errors.ConnectionFailure as e:
@@ -69,6 +87,22 @@ class DatabaseManager:
             self.logger.error(f"Unexpected error during connection: {e}")
             return False
     
+    def _ensure_indexes(self) -> None:
+        """Create indexes for the user and password reset collections."""
+        try:
+            # Unique email index turns lookups into index seeks and guards against duplicate accounts
+            self.usuarios.create_index("email", unique=True)
+            
+            # Reset token lookups by token, and clearing a user's old tokens on a new request
+            self.reset_tokens.create_index("token", unique=True)
+            self.reset_tokens.create_index("user_id")
+            
+            # TTL index lets MongoDB purge expired password reset tokens
+            self.reset_tokens.create_index("expires_at", expireAfterSeconds=0)
+            
+        except Exception as e:
+            self.logger.warning(f"Failed to create indexes: {e}")
+    
     def close(self) -> None:
         """Close the database connection."""
         if self.client:
@@ -1,13 +1,20 @@
 import logging
+import re
 
+from bson import ObjectId
 from flask import Blueprint, request, jsonify, make_response
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, get_jwt_identity
 
-from utils.rate_limits import RATE_LIMITS
+from auth import auth_required
+from utils.rate_limits import RATE_LIMITS, get_remote_address_and_email, get_submitted_email
 from utils.cookie_auth import get_request_info, create_cookie_response, clear_auth_cookies, get_token_from_cookie
+from utils.jwt_cache import cache_issued_access_token
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+# Basic email shape check: local@domain.tld with no whitespace or extra '@'
+_EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
 
 def init_auth_routes(auth_manager, token_manager, limiter):
     """Initialize auth routes with authentication manager."""
@@ -19,14 +26,14 @@ def init_auth_routes(auth_manager, token_manager, limiter):
         try:
             data = request.get_json()
             
-            if not data or not data.get('email') or not data.get('password'):
+            if not isinstance(data, dict) or not data.get('email') or not data.get('password'):
                 return jsonify({"success": False, "message": "Email and password are required"}), 400
             
             email = data['email'].lower().strip()
             password = data['password']
             
             # Basic email validation
-            if '@' not in email or '.' not in email:
+            if not _EMAIL_RE.match(email):
                 return jsonify({"success": False, "message": "Invalid email format"}), 400
             
             # Password strength validation
@@ -41,17 +48,19 @@ def init_auth_routes(auth_manager, token_manager, limiter):
                 return jsonify(result), 400
                 
         except Exception as e:
-            logging.error(f"Registration endpoint error: {e}")
+            logging.error("Registration endpoint error: %s", e)
             return jsonify({"success": False, "message": "Internal server error"}), 500
 
     @auth_bp.route('/login', methods=['POST'])
     @limiter.limit(RATE_LIMITS['auth_strict'])
+    @limiter.limit(RATE_LIMITS['auth_credential'], key_func=get_remote_address_and_email)
+    @limiter.limit(RATE_LIMITS['auth_account'], key_func=get_submitted_email)
     def login():
         """User login endpoint."""
         try:
             data = request.get_json()
             
-            if not data or not data.get('email') or not data.get('password'):
+            if not isinstance(data, dict) or not data.get('email') or not data.get('password'):
                 return jsonify({"success": False, "message": "Email and password are required"}), 400
             
             email = data['email'].lower().strip()
@@ -62,6 +71,7 @@ def init_auth_routes(auth_manager, token_manager, limiter):
             if result['success']:
                 # Create access token (JWT)
                 access_token = create_access_token(identity=result['user']['id'])
+                cache_issued_access_token(access_token)
                 
                 # Create stateful refresh token
                 request_info = get_request_info()
@@ -79,7 +89,7 @@ def init_auth_routes(auth_manager, token_manager, limiter):
                 return jsonify(result), 401
                 
         except Exception as e:
-            logging.error(f"Login endpoint error: {e}")
+            logging.error("Login endpoint error: %s", e)
             return jsonify({"success": False, "message": "Internal server error"}), 500
 
     @auth_bp.route('/refresh', methods=['POST'])
@@ -105,6 +115,7 @@ def init_auth_routes(auth_manager, token_manager, limiter):
             
             # Create new access token
             new_access_token = create_access_token(identity=result['user_id'])
+            cache_issued_access_token(new_access_token)
             
             # Create response with new tokens in cookies
             response_data = {
@@ -115,23 +126,25 @@ def init_auth_routes(auth_manager, token_manager, limiter):
             return create_cookie_response(response_data, new_access_token, result['new_token']), 200
             
         except Exception as e:
-            logging.error(f"Refresh endpoint error: {e}")
+            logging.error("Refresh endpoint error: %s", e)
             return jsonify({"success": False, "message": "Internal server error"}), 500
 
     @auth_bp.route('/request-password-reset', methods=['POST'])
     @limiter.limit(RATE_LIMITS['password_reset_request'])
+    @limiter.limit(RATE_LIMITS['auth_credential'], key_func=get_remote_address_and_email)
+    @limiter.limit(RATE_LIMITS['auth_account'], key_func=get_submitted_email)
     def request_password_reset():
         """Request password reset token."""
         try:
             data = request.get_json()
             
-            if not data or not data.get('email'):
+            if not isinstance(data, dict) or not data.get('email'):
                 return jsonify({"success": False, "message": "Email is required"}), 400
             
             email = data['email'].lower().strip()
             
             # Basic email validation
-            if '@' not in email or '.' not in email:
+            if not _EMAIL_RE.match(email):
                 return jsonify({"success": False, "message": "Invalid email format"}), 400
             
             result = auth_manager.request_password_reset(email)
@@ -140,7 +153,7 @@ def init_auth_routes(auth_manager, token_manager, limiter):
             return jsonify(result), 200
                 
         except Exception as e:
-            logging.error(f"Password reset request endpoint error: {e}")
+            logging.error("Password reset request endpoint error: %s", e)
             return jsonify({"success": False, "message": "Internal server error"}), 500
 
     @auth_bp.route('/reset-password', methods=['POST'])
@@ -150,7 +163,7 @@ def init_auth_routes(auth_manager, token_manager, limiter):
         try:
             data = request.get_json()
             
-            if not data or not data.get('token') or not data.get('password'):
+            if not isinstance(data, dict) or not data.get('token') or not data.get('password'):
                 return jsonify({"success": False, "message": "Token and password are required"}), 400
             
             token = data['token']
@@ -168,7 +181,7 @@ def init_auth_routes(auth_manager, token_manager, limiter):
                 return jsonify(result), 400
                 
         except Exception as e:
-            logging.error(f"Password reset endpoint error: {e}")
+            logging.error("Password reset endpoint error: %s", e)
             return jsonify({"success": False, "message": "Internal server error"}), 500
 
     @auth_bp.route('/logout', methods=['POST'])
@@ -193,12 +206,12 @@ def init_auth_routes(auth_manager, token_manager, limiter):
             return response, 200
             
         except Exception as e:
-            logging.error(f"Logout endpoint error: {e}")
+            logging.error("Logout endpoint error: %s", e)
             return jsonify({"success": False, "message": "Internal server error"}), 500
 
     @auth_bp.route('/sessions', methods=['GET'])
     @limiter.limit(RATE_LIMITS['protected_moderate'])
-    @jwt_required()
+    @auth_required
     def get_user_sessions():
         """Get all active sessions for the current user."""
         try:
@@ -211,24 +224,27 @@ def init_auth_routes(auth_manager, token_manager, limiter):
             }), 200
             
         except Exception as e:
-            logging.error(f"Get sessions endpoint error: {e}")
+            logging.error("Get sessions endpoint error: %s", e)
             return jsonify({"success": False, "message": "Internal server error"}), 500
 
     @auth_bp.route('/sessions/<session_id>', methods=['DELETE'])
     @limiter.limit(RATE_LIMITS['auth_moderate'])
-    @jwt_required()
+    @auth_required
     def revoke_session(session_id):
         """Revoke a specific session."""
         try:
+            # A malformed id can never match a session
+            if not ObjectId.is_valid(session_id):
+                return jsonify({"success": False, "message": "Session not found"}), 404
+            
             user_id = get_jwt_identity()
             
             # Find the session and verify it belongs to the user
-            from bson import ObjectId
             session = token_manager.db_manager.database["refresh_tokens"].find_one({
                 "_id": ObjectId(session_id),
                 "user_id": user_id,
                 "is_active": True
-            })
+            }, {"token": 1})
             
             if not session:
                 return jsonify({"success": False, "message": "Session not found"}), 404
@@ -242,30 +258,20 @@ def init_auth_routes(auth_manager, token_manager, limiter):
                 return jsonify({"success": False, "message": "Failed to revoke session"}), 500
                 
         except Exception as e:
-            logging.error(f"Revoke session endpoint error: {e}")
+            logging.error("Revoke session endpoint error: %s", e)
             return jsonify({"success": False, "message": "Internal server error"}), 500
 
     @auth_bp.route('/sessions/revoke-all', methods=['POST'])
     @limiter.limit(RATE_LIMITS['auth_strict'])
-    @jwt_required()
+    @auth_required
     def revoke_all_sessions():
         """Revoke all sessions for the current user except the current one."""
         try:
             user_id = get_jwt_identity()
             current_refresh_token = get_token_from_cookie('refresh_token')
             
-            # Get all user sessions
-            sessions = token_manager.get_user_sessions(user_id)
-            revoked_count = 0
-            
-            for session in sessions:
-                # Don't revoke the current session
-                if current_refresh_token and session.get('token') == current_refresh_token:
-                    continue
-                    
-                # Revoke other sessions
-                if token_manager.revoke_token(session['token'], "revoke_all_others"):
-                    revoked_count += 1
+            # Revoke every other session in a single update, keeping the current one
+            revoked_count = token_manager.revoke_tokens_bulk(user_id, current_refresh_token, "revoke_all_others")
             
             return jsonify({
                 "success": True,
@@ -274,7 +280,7 @@ def init_auth_routes(auth_manager, token_manager, limiter):
             }), 200
             
         except Exception as e:
-            logging.error(f"Revoke all sessions endpoint error: {e}")
+            logging.error("Revoke all sessions endpoint error: %s", e)
             return jsonify({"success": False, "message": "Internal server error"}), 500
     
     return auth_bp
\ No newline at end of file
@@ -1,4 +1,5 @@
 import logging
+from functools import lru_cache
 
 from flask import Blueprint, jsonify
 from flask_jwt_extended import get_jwt_identity
@@ -6,9 +7,16 @@ from bson import ObjectId
 
 from auth import auth_required
 from utils.rate_limits import RATE_LIMITS
+from utils.user_cache import get_cached_profile, cache_profile
 
 user_bp = Blueprint('user', __name__, url_prefix='/api')
 
+# Static body, so liveness probes skip JSON serialization
+HEALTH_RESPONSE = b'{"status":"healthy","message":"API is running"}'
+
+# ObjectId is immutable, so repeat lookups for the same user reuse the parsed id
+_object_id = lru_cache(maxsize=10_000)(ObjectId)
+
 
 def init_user_routes(db_manager, limiter):
     """Initialize user routes with database manager."""
@@ -20,29 +28,38 @@ def init_user_routes(db_manager, limiter):
         """Get user profile (protected route example)."""
         try:
             user_id = get_jwt_identity()
-            user = db_manager.usuarios.find_one({"_id": ObjectId(user_id)})
+            profile = get_cached_profile(user_id)
             
-            if not user:
-                return jsonify({"success": False, "message": "User not found"}), 404
-            
-            return jsonify({
-                "success": True,
-                "user": {
-                    "id": str(user["_id"]),
+            if profile is None:
+                user = db_manager.usuarios.find_one(
+                    {"_id": _object_id(user_id)},
+                    {"_id": 0, "email": 1, "created_at": 1, "is_active": 1}
+                )
+                
+                if not user:
+                    return jsonify({"success": False, "message": "User not found"}), 404
+                
+                profile = {
+                    "id": user_id,
                     "email": user["email"],
                     "created_at": user.get("created_at"),
                     "is_active": user.get("is_active", True)
                 }
+                cache_profile(user_id, profile)
+            
+            return jsonify({
+                "success": True,
+                "user": profile
             }), 200
             
         except Exception as e:
-            logging.error(f"Profile endpoint error: {e}")
+            logging.error("Profile endpoint error: %s", e)
             return jsonify({"success": False, "message": "Internal server error"}), 500
 
     @user_bp.route('/health', methods=['GET'])
-    @limiter.limit(RATE_LIMITS['public'])
+    @limiter.exempt
     def health_check():
-        """Health check endpoint."""
-        return jsonify({"status": "healthy", "message": "API is running"}), 200
+        """Health check endpoint (not rate limited so probes never touch limiter storage)."""
+        return HEALTH_RESPONSE, 200, {"Content-Type": "application/json"}
     
     return user_bp
\ No newline at end of file
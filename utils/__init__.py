@@ -1,5 +1,7 @@
-from .rate_limits import get_remote_address
+from .rate_limits import get_remote_address, get_client_ip
 from .error_handlers import setup_error_handlers
+from .json_provider import OrjsonProvider
+from .log_queue import setup_queue_logging
 from .cookie_auth import get_request_info, set_auth_cookies, clear_auth_cookies, get_token_from_cookie, create_cookie_response
 
-__all__ = ['get_remote_address', 'setup_error_handlers', 'get_request_info', 'set_auth_cookies', 'clear_auth_cookies', 'get_token_from_cookie', 'create_cookie_response']
\ No newline at end of file
+__all__ = ['get_remote_address', 'get_client_ip', 'setup_error_handlers', 'OrjsonProvider', 'setup_queue_logging', 'get_request_info', 'set_auth_cookies', 'clear_auth_cookies', 'get_token_from_cookie', 'create_cookie_response']
\ No newline at end of file
@@ -1,6 +1,29 @@
 from flask import request, make_response
 from datetime import datetime, timedelta
 import logging
+import os
+
+from .rate_limits import get_client_ip
+
+# Cookie attributes are fixed for the life of the process, so resolve them once at import
+_IS_DEV = os.getenv('FLASK_ENV') == 'development' or os.getenv('FLASK_DEBUG') == '1'
+_SECURE = not _IS_DEV  # False for development, True for production
+_SAMESITE = 'Lax' if _IS_DEV else 'Strict'  # More lenient for dev
+
+ACCESS_TOKEN_MAX_AGE = 2 * 60 * 60  # 2 hours in seconds
+REFRESH_TOKEN_MAX_AGE = 30 * 24 * 60 * 60  # 30 days in seconds
+
+
+def _cookie_attributes(max_age: int, path: str) -> str:
+    """Build the static attribute suffix of a Set-Cookie header."""
+    secure = '; Secure' if _SECURE else ''
+    return f"; Max-Age={max_age}{secure}; HttpOnly; Path={path}; SameSite={_SAMESITE}"
+
+
+# Everything but the token value is static, so auth cookies skip Werkzeug's dump_cookie.
+# Tokens are URL-safe base64/JWT strings and never need quoting.
+_ACCESS_COOKIE_ATTRS = _cookie_attributes(ACCESS_TOKEN_MAX_AGE, '/api')  # Restrict to API endpoints
+_REFRESH_COOKIE_ATTRS = _cookie_attributes(REFRESH_TOKEN_MAX_AGE, '/api/auth')  # Restrict to auth endpoints
 
 
 def get_request_info() -> dict:
@@ -12,66 +35,23 @@ def get_request_info() -> dict:
     }
 
 
-def get_client_ip() -> str:
-    """Get the real client IP, considering proxy headers."""
-    # Check for X-Forwarded-For header (for proxied requests)
-    forwarded_for = request.headers.get('X-Forwarded-For')
-    if forwarded_for:
-        return forwarded_for.split(',')[0].strip()
-    
-    # Check for X-Real-IP header (nginx proxy)
-    real_ip = request.headers.get('X-Real-IP')
-    if real_ip:
-        return real_ip
-    
-    # Fall back to remote_addr
-    return request.remote_addr or '127.0.0.1'
-
-
 def set_auth_cookies(response, access_token: str, refresh_token: str):
     """Set secure httpOnly cookies for authentication."""
-    
-    # Determine if we're in development mode
-    import os
-    is_development = os.getenv('FLASK_ENV') == 'development' or os.getenv('FLASK_DEBUG') == '1'
-    
-    # Access token cookie (2 hours)
-    response.set_cookie(
-        'access_token',
-        access_token,
-        max_age=2 * 60 * 60,  # 2 hours in seconds
-        httponly=True,
-        secure=not is_development,  # False for development, True for production
-        samesite='Lax' if is_development else 'Strict',  # More lenient for dev
-        path='/api'  # Restrict to API endpoints
-    )
-    
-    # Refresh token cookie (30 days)
-    response.set_cookie(
-        'refresh_token',
-        refresh_token,
-        max_age=30 * 24 * 60 * 60,  # 30 days in seconds
-        httponly=True,
-        secure=not is_development,  # False for development, True for production
-        samesite='Lax' if is_development else 'Strict',  # More lenient for dev
-        path='/api/auth'  # Restrict to auth endpoints
-    )
+    response.headers.add('Set-Cookie', 'access_token=' + access_token + _ACCESS_COOKIE_ATTRS)
+    response.headers.add('Set-Cookie', 'refresh_token=' + refresh_token + _REFRESH_COOKIE_ATTRS)
     
     logging.info("Auth cookies set successfully")
 
 
 def clear_auth_cookies(response):
     """Clear authentication cookies."""
-    import os
-    is_development = os.getenv('FLASK_ENV') == 'development' or os.getenv('FLASK_DEBUG') == '1'
-    
     response.set_cookie(
         'access_token',
         '',
         expires=0,
         httponly=True,
-        secure=not is_development,
-        samesite='Lax' if is_development else 'Strict',
+        secure=_SECURE,
+        samesite=_SAMESITE,
         path='/api'
     )
     
@@ -80,8 +60,8 @@ def clear_auth_cookies(response):
         '',
         expires=0,
         httponly=True,
-        secure=not is_development,
-        samesite='Lax' if is_development else 'Strict',
+        secure=_SECURE,
+        samesite=_SAMESITE,
         path='/api/auth'
     )
     
@@ -11,9 +11,8 @@ def handle_rate_limit_exceeded(error):
     user_agent = request.headers.get('User-Agent', 'unknown')
     
     logging.warning(
-        f"Rate limit exceeded - IP: {remote_addr}, "
-        f"Endpoint: {endpoint}, "
-        f"User-Agent: {user_agent[:100]}..."
+        "Rate limit exceeded - IP: %s, Endpoint: %s, User-Agent: %s...",
+        remote_addr, endpoint, user_agent[:100]
     )
     
     # Get rate limit details
@@ -49,7 +48,7 @@ def setup_error_handlers(app):
     
     @app.errorhandler(500)
     def internal_error_handler(error):
-        logging.error(f"Internal server error: {error}")
+        logging.error("Internal server error: %s", error)
         return jsonify({
             "success": False,
             "error": "internal_server_error",
@@ -70,4 +69,12 @@ def setup_error_handlers(app):
             "success": False,
             "error": "bad_request",
             "message": "The request was invalid"
-        }), 400
\ No newline at end of file
+        }), 400
+    
+    @app.errorhandler(413)
+    def payload_too_large_handler(error):
+        return jsonify({
+            "success": False,
+            "error": "payload_too_large",
+            "message": "The request body is too large"
+        }), 413
@@ -0,0 +1,29 @@
+import orjson
+from bson import ObjectId
+from flask.json.provider import JSONProvider
+
+# Naive datetimes from MongoDB are UTC, so serialize them with an explicit offset
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC
+
+
+def _default(obj):
+    """Serialize types orjson doesn't handle natively."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson for faster response encoding."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """Build a JSON response from orjson bytes without a str round-trip."""
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+        return self._app.response_class(body, mimetype="application/json")
\ No newline at end of file
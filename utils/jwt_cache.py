@@ -0,0 +1,91 @@
+import hashlib
+import threading
+import time
+from typing import Optional, Tuple
+
+import jwt
+from cachetools import TLRUCache
+from flask import current_app, request
+from flask_jwt_extended.config import config
+from flask_jwt_extended.default_callbacks import default_blocklist_callback, default_token_verification_callback
+from flask_jwt_extended.utils import get_unverified_jwt_headers
+
+# Upper bound on how long a verified token is trusted without re-checking its signature
+MAX_CACHE_SECONDS = 300
+
+
+def _time_to_use(key, value, now):
+    """Expire a cache entry at the token's exp claim, capped at MAX_CACHE_SECONDS."""
+    _, jwt_data = value
+    exp = jwt_data.get("exp")
+    ttl = MAX_CACHE_SECONDS if exp is None else min(max(exp - time.time(), 0), MAX_CACHE_SECONDS)
+    return now + ttl
+
+
+# Guards every app's cache; each app keeps its own in app.extensions, so apps with
+# different signing keys never accept each other's tokens from cache
+_lock = threading.Lock()
+
+
+def _get_cache() -> TLRUCache:
+    """Return the current app's cache of verified access tokens: blake2b-128(token) -> (jwt_header, jwt_data)."""
+    cache = current_app.extensions.get("jwt_cache")
+    if cache is None:
+        cache = current_app.extensions.setdefault("jwt_cache", TLRUCache(maxsize=50_000, ttu=_time_to_use))
+    return cache
+
+
+def cache_enabled() -> bool:
+    """Whether the current app may serve verified tokens from the cache.
+
+    Cache hits skip flask_jwt_extended's per-request callbacks, so the cache is off
+    once the app registers a blocklist, user lookup or claims verification loader.
+    """
+    jwt_manager = current_app.extensions["flask-jwt-extended"]
+    return (jwt_manager._token_in_blocklist_callback is default_blocklist_callback
+            and jwt_manager._user_lookup_callback is None
+            and jwt_manager._token_verification_callback is default_token_verification_callback)
+
+
+def _cache_key(encoded_token: str) -> bytes:
+    """Key entries on a 16-byte digest rather than the full encoded token."""
+    return hashlib.blake2b(encoded_token.encode('utf-8'), digest_size=16).digest()
+
+
+def get_token_from_header() -> Optional[str]:
+    """Extract the JWT from the configured auth header, if sent in the plain '<type> <jwt>' form."""
+    auth_header = request.headers.get(config.header_name, '').strip()
+    if not auth_header:
+        return None
+
+    if config.header_type:
+        prefix = f"{config.header_type} "
+        if not auth_header.startswith(prefix):
+            return None
+        auth_header = auth_header[len(prefix):].strip()
+
+    # Anything unusual (e.g. comma-delimited fields) goes through the full decode path
+    if not auth_header or ' ' in auth_header or ',' in auth_header:
+        return None
+    return auth_header
+
+
+def get_cached_jwt(encoded_token: str) -> Optional[Tuple[dict, dict]]:
+    """Return the (header, claims) of a previously verified token, or None."""
+    with _lock:
+        return _get_cache().get(_cache_key(encoded_token))
+
+
+def cache_verified_jwt(encoded_token: str, jwt_header: dict, jwt_data: dict) -> None:
+    """Remember a token that just passed full verification. Never call this for invalid tokens."""
+    with _lock:
+        _get_cache()[_cache_key(encoded_token)] = (jwt_header, jwt_data)
+
+
+def cache_issued_access_token(encoded_token: str) -> None:
+    """Pre-populate the cache with an access token this server just signed."""
+    if not cache_enabled():
+        return
+    jwt_header = get_unverified_jwt_headers(encoded_token)
+    jwt_data = jwt.decode(encoded_token, options={"verify_signature": False})
+    cache_verified_jwt(encoded_token, jwt_header, jwt_data)
\ No newline at end of file
@@ -0,0 +1,57 @@
+import atexit
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_queue_logging() -> None:
+    """Route root log records through a queue drained by a background thread.
+
+    Request threads only enqueue records; the configured handlers (e.g. the
+    stderr stream handler) do the actual I/O on the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    if not handlers:
+        return
+
+    log_queue = queue.SimpleQueue()
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # Flush pending records on interpreter shutdown
+    atexit.register(_stop_listener)
+    # A forked child (e.g. a gunicorn worker under --preload) inherits the QueueHandler
+    # but not the listener thread, so it needs a listener of its own
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_listener)
+
+
+def _restart_listener() -> None:
+    """Start a fresh listener on the inherited queue and handlers after a fork."""
+    global _listener
+    if _listener is None:
+        return
+    # Records queued before the fork are the parent's to write; drop the child's copies
+    log_queue = _listener.queue
+    while not log_queue.empty():
+        log_queue.get_nowait()
+    _listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener() -> None:
+    """Stop the current process's listener, draining queued records."""
+    if _listener is not None:
+        _listener.stop()
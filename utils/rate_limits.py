@@ -1,24 +1,56 @@
-from flask import request
+from flask import g, request
 
 
-def get_remote_address():
-    """Get the remote address for rate limiting.
+def get_client_ip():
+    """Get the real client IP, considering proxy headers.
     
-    Considers X-Forwarded-For header for proxy scenarios.
+    Resolved once per request and kept on flask.g, since both the rate limiter
+    and session tracking ask for it.
     """
+    if 'client_ip' in g:
+        return g.client_ip
+    
     # Check for X-Forwarded-For header (for proxied requests)
     forwarded_for = request.headers.get('X-Forwarded-For')
     if forwarded_for:
         # Take the first IP in the chain
-        return forwarded_for.split(',')[0].strip()
+        client_ip = forwarded_for.partition(',')[0].strip()
+    else:
+        # Check for X-Real-IP header (nginx proxy), then fall back to remote_addr
+        client_ip = request.headers.get('X-Real-IP') or request.remote_addr or '127.0.0.1'
+    
+    g.client_ip = client_ip
+    return client_ip
+
+
+# Rate limit key function; same address used for session tracking
+get_remote_address = get_client_ip
+
+
+def _submitted_email():
+    """Normalized email from the JSON body, or '' if there is none."""
+    # The body may be any JSON value; a key function must never raise, or the limiter
+    # treats it as a storage failure and falls back to per-process counters
+    data = request.get_json(silent=True)
+    return str(data.get('email', '')).lower().strip() if isinstance(data, dict) else ''
+
+
+def get_remote_address_and_email():
+    """Get a rate limit key combining the remote address and the submitted email.
     
-    # Check for X-Real-IP header (nginx proxy)
-    real_ip = request.headers.get('X-Real-IP')
-    if real_ip:
-        return real_ip
+    Used on credential endpoints so one client can't spread guesses across accounts
+    and one account can't be hammered from behind a shared address.
+    """
+    return f"{get_remote_address()}:{_submitted_email()}"
+
+
+def get_submitted_email():
+    """Get a rate limit key from the submitted email alone.
     
-    # Fall back to remote_addr
-    return request.remote_addr or '127.0.0.1'
+    The address part of the per-(IP, email) key comes from X-Forwarded-For, which a
+    client can rotate freely; this bucket caps guesses against one account regardless.
+    """
+    return f"email:{_submitted_email()}"
 
 
 # Rate limit configurations for different endpoint types
@@ -26,6 +58,8 @@ RATE_LIMITS = {
     # Authentication endpoints (most restrictive)
     'auth_strict': '5 per minute',  # Login, register
     'auth_moderate': '30 per minute',  # Refresh token (more lenient)
+    'auth_credential': '5 per minute;50 per hour',  # Per (IP, email) on login and reset request
+    'auth_account': '10 per minute;100 per hour',  # Per email on login and reset request, whatever the address
     
     # Password reset (very restrictive due to potential abuse)
     'password_reset_request': '3 per minute',  # Request reset
@@ -35,7 +69,7 @@ RATE_LIMITS = {
     'protected_moderate': '100 per minute',  # Profile, dashboard data
     
     # Public endpoints (lenient)
-    'public': '200 per minute',  # Health check
+    'public': '200 per minute',  # Public endpoints (/health is exempt)
     
     # Global rate limit (safety net)
     'global': '1000 per hour',
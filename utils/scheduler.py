@@ -1,60 +1,87 @@
 import threading
-import time
 import logging
-from datetime import datetime
 
 
 class TokenCleanupScheduler:
-    """Background scheduler for token cleanup tasks."""
+    """Background scheduler for token cleanup tasks.
     
-    def __init__(self, token_manager, interval_hours=24):
+    RefreshTokenManager creates TTL indexes on ``expires_at`` and ``delete_at``, so
+    MongoDB purges stale tokens on its own and the app does not start this. It is
+    kept for deployments that want a periodic sweep as well, e.g. for revoked
+    tokens stored before ``delete_at`` existed.
+    """
+    
+    def __init__(self, token_manager, interval_hours=24, batch_size=10_000, max_batches_per_run=100):
         self.token_manager = token_manager
         self.interval_hours = interval_hours
-        self.running = False
+        self.batch_size = batch_size
+        self.max_batches_per_run = max_batches_per_run
         self.thread = None
+        # Set by stop(); also wakes the loop out of its interval wait
+        self._stop_event = threading.Event()
         self.logger = logging.getLogger(__name__)
     
     def start(self):
         """Start the cleanup scheduler."""
-        if not self.running:
-            self.running = True
+        if self.thread is None or not self.thread.is_alive():
+            self._stop_event.clear()
             self.thread = threading.Thread(target=self._cleanup_loop, daemon=True)
             self.thread.start()
-            self.logger.info(f"Token cleanup scheduler started (interval: {self.interval_hours}h)")
+            self.logger.info("Token cleanup scheduler started (interval: %sh)", self.interval_hours)
     
     def stop(self):
-        """Stop the cleanup scheduler."""
-        self.running = False
+        """Stop the cleanup scheduler, waiting for a run in progress to finish."""
+        self._stop_event.set()
         if self.thread:
             self.thread.join()
+            self.thread = None
             self.logger.info("Token cleanup scheduler stopped")
     
     def _cleanup_loop(self):
         """Main cleanup loop that runs in background."""
-        while self.running:
+        while not self._stop_event.is_set():
             try:
                 self.logger.info("Running token cleanup...")
-                cleaned_count = self.token_manager.cleanup_expired_tokens()
+                cleaned_count = self._cleanup_in_batches()
                 
                 if cleaned_count > 0:
-                    self.logger.info(f"Cleaned up {cleaned_count} expired tokens")
-                
-                # Get token statistics
-                stats = self.token_manager.get_token_stats()
-                self.logger.info(f"Token stats - Active: {stats['active']}, Inactive: {stats['inactive']}, Total: {stats['total']}")
+                    self.logger.info("Cleaned up %d expired tokens", cleaned_count)
                 
+                # Stats are only ever logged, so skip querying them when INFO is filtered out
+                if self.logger.isEnabledFor(logging.INFO):
+                    stats = self.token_manager.get_token_stats()
+                    self.logger.info("Token stats - Active: %s, Inactive: %s, Total: %s",
+                                     stats['active'], stats['inactive'], stats['total'])
+            
             except Exception as e:
-                self.logger.error(f"Token cleanup error: {e}")
+                self.logger.error("Token cleanup error: %s", e)
+            
+            # Wait for the specified interval (convert hours to seconds); returns early on stop()
+            if self._stop_event.wait(timeout=self.interval_hours * 3600):
+                break
+    
+    def _cleanup_in_batches(self):
+        """Remove stale tokens in batches of ``batch_size`` until one comes back short.
+        
+        Bounded by ``max_batches_per_run``; the next run picks up any remainder.
+        Pauses briefly between batches and stops early if the scheduler is stopping.
+        """
+        total_cleaned = 0
+        for _ in range(self.max_batches_per_run):
+            cleaned_count = self.token_manager.cleanup_expired_tokens(limit=self.batch_size)
+            total_cleaned += cleaned_count
+            self.logger.info("Cleanup batch removed %d tokens", cleaned_count)
             
-            # Sleep for the specified interval (convert hours to seconds)
-            time.sleep(self.interval_hours * 3600)
+            if cleaned_count < self.batch_size or self._stop_event.wait(timeout=0.05):
+                break
+        return total_cleaned
     
     def run_cleanup_now(self):
         """Run cleanup immediately (useful for manual triggers)."""
         try:
-            cleaned_count = self.token_manager.cleanup_expired_tokens()
-            self.logger.info(f"Manual cleanup completed - removed {cleaned_count} tokens")
+            cleaned_count = self._cleanup_in_batches()
+            self.logger.info("Manual cleanup completed - removed %d tokens", cleaned_count)
             return cleaned_count
         except Exception as e:
-            self.logger.error(f"Manual cleanup error: {e}")
-            return 0
\ No newline at end of file
+            self.logger.error("Manual cleanup error: %s", e)
+            return 0
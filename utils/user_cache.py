@@ -0,0 +1,21 @@
+import threading
+from typing import Optional
+
+from cachetools import TTLCache
+
+# Short-lived, process-local cache of profile data keyed by user_id string.
+# For multi-process deployments that need cross-worker invalidation, back this with Redis.
+_profiles = TTLCache(maxsize=50_000, ttl=30)
+_lock = threading.Lock()
+
+
+def get_cached_profile(user_id: str) -> Optional[dict]:
+    """Return a cached profile for the user, or None on a miss."""
+    with _lock:
+        return _profiles.get(user_id)
+
+
+def cache_profile(user_id: str, profile: dict) -> None:
+    """Store a profile fetched from the database."""
+    with _lock:
+        _profiles[user_id] = profile
\ No newline at end of file